@@ -0,0 +1,62 @@
+// Keeps the AssemblyScript compiler loaded, and compiles every source it is sent on stdin.
+//
+// Usage: npx -p assemblyscript@<version> node asc_worker.mjs <asc flags>
+//
+// Every message is prefixed with its length as a little endian u32. For each source received, two messages
+// are written to stdout: the wasm binary (empty if the compilation failed), and the compiler's error output.
+import fs from "fs";
+import path from "path";
+import { pathToFileURL } from "url";
+
+// npx puts the bin directory of the package it installed on the PATH; the compiler lives next to it.
+function findAsc() {
+  for (const dir of (process.env.PATH || "").split(path.delimiter)) {
+    const candidate = path.join(dir, "..", "assemblyscript", "dist", "asc.js");
+    if (fs.existsSync(candidate)) {
+      return pathToFileURL(candidate).href;
+    }
+  }
+  return "assemblyscript/asc";
+}
+
+const flags = process.argv.slice(2);
+const asc = await import(findAsc());
+
+async function compile(source) {
+  let binary = new Uint8Array(0);
+  const { error, stderr } = await asc.main(["input.ts", "-o", "output.wasm", ...flags], {
+    readFile: (filename) => (filename === "input.ts" ? source : null),
+    writeFile: (filename, contents) => {
+      if (filename === "output.wasm") {
+        binary = contents;
+      }
+    },
+    listFiles: () => [],
+  });
+  let output = stderr.toString();
+  if (error) {
+    binary = new Uint8Array(0);
+    output = output || error.message;
+  }
+  return [Buffer.from(binary), Buffer.from(output, "utf-8")];
+}
+
+function writeFrame(data) {
+  const header = Buffer.alloc(4);
+  header.writeUInt32LE(data.length);
+  process.stdout.write(header);
+  process.stdout.write(data);
+}
+
+let pending = Buffer.alloc(0);
+for await (const chunk of process.stdin) {
+  pending = Buffer.concat([pending, chunk]);
+  while (pending.length >= 4 && pending.length >= 4 + pending.readUInt32LE(0)) {
+    const length = pending.readUInt32LE(0);
+    const source = pending.subarray(4, 4 + length).toString("utf-8");
+    pending = pending.subarray(4 + length);
+    for (const frame of await compile(source)) {
+      writeFrame(frame);
+    }
+  }
+}
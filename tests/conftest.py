@@ -1,3 +1,15 @@
+import ast
+import hashlib
+import inspect
+import os
+import stat
+import struct
+import sys
+import tempfile
+import textwrap
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
 import pytest
 import wasmer
 import subprocess
@@ -5,25 +17,244 @@ import subprocess
 from wasmbind import Module
 
 
+# Compiled modules are cached on disk, keyed by a hash of their source, so that a test run only has to invoke
+# the AssemblyScript compiler for sources it has not seen before. Set WASMBIND_CACHE_DIR to keep them elsewhere.
+# The cache holds native code we load (see load_wasm_module()), so it is private to the user, never shared.
+ASC_CACHE_DIR = Path(
+    os.environ.get('WASMBIND_CACHE_DIR')
+    or Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'wasmbind-tests')
+
+# Serialized wasmer modules are only valid for the wasmer version which created them.
+WASMER_CACHE_TAG = 'wasmer-' + getattr(wasmer, '__version__', 'unknown')
+
+# The compiler version is pinned, rather than whatever npx considers current, so that it can be part of the
+# cache key without having to start the compiler to find out.
+ASC_VERSION = '0.27.0'
+
+ASC_FLAGS = ['--use', 'abort=']
+
+ASC_WORKER_SCRIPT = Path(__file__).parent / 'asc_worker.mjs'
+
+# Messages to and from the compiler worker are prefixed with their length.
+FRAME_HEADER = struct.Struct('<I')
+
+
+def get_cache_key(assemblyscript: str) -> str:
+    # The compiler version and flags are part of the key, so changing them invalidates the cache.
+    return hashlib.sha256(' '.join([ASC_VERSION] + ASC_FLAGS + [assemblyscript]).encode('utf-8')).hexdigest()
+
+
+def is_trusted(path: Path) -> bool:
+    """Whether `path` was written by us, and nobody else could have changed it since.
+    """
+    if not hasattr(os, 'getuid'):
+        return True
+
+    for p in (path.parent, path):
+        st = p.stat()
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+    return True
+
+
+def store_in_cache(filename: str, data: bytes):
+    """Write `data` to the cache.
+
+    The file is moved into place atomically, so that parallel test workers never see a partially written module.
+    """
+    ASC_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd, partial_file = tempfile.mkstemp(dir=str(ASC_CACHE_DIR), suffix='.partial')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(partial_file, str(ASC_CACHE_DIR / filename))
+
+
+class AscWorker:
+    """A long-lived node process running the AssemblyScript compiler, see asc_worker.mjs.
+
+    Starting node and the compiler is what dominates the cost of compiling the small snippets the tests use,
+    so we only want to pay for it once per session.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ['npx', '-q', '-p', f'assemblyscript@{ASC_VERSION}', 'node', str(ASC_WORKER_SCRIPT)] + ASC_FLAGS,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def compile(self, assemblyscript: str) -> Tuple[bytes, str]:
+        """Return the wasm bytes, which are empty if the compilation failed, and the output of the compiler.
+        """
+        data = assemblyscript.encode('utf-8')
+        self.process.stdin.write(FRAME_HEADER.pack(len(data)) + data)
+        self.process.stdin.flush()
+
+        wasm_bytes = self._read_frame()
+        err = self._read_frame().decode('utf-8')
+        return wasm_bytes, err
+
+    def _read_frame(self) -> bytes:
+        header = self.process.stdout.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise RuntimeError(f"The AssemblyScript compiler worker exited unexpectedly, try running "
+                               f"{ASC_WORKER_SCRIPT} by hand.")
+        (length,) = FRAME_HEADER.unpack(header)
+        return self.process.stdout.read(length)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+_asc_worker: Optional[AscWorker] = None
+
+
+def get_asc_worker() -> AscWorker:
+    global _asc_worker
+    if _asc_worker is None:
+        _asc_worker = AscWorker()
+    return _asc_worker
+
+
+def reset_asc_worker():
+    """Get rid of a worker which failed, so that the next compilation starts a new one.
+    """
+    global _asc_worker
+    if _asc_worker is not None:
+        _asc_worker.process.kill()
+        _asc_worker.process.wait()
+        _asc_worker = None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    global _asc_worker
+    if _asc_worker is not None:
+        _asc_worker.close()
+        _asc_worker = None
+
+
+def compile_assemblyscript(assemblyscript: str) -> bytes:
+    """Run "asc", the AssemblyScript compiler, and return the wasm bytes. Uses the on-disk cache if possible.
+    """
+    key = get_cache_key(assemblyscript)
+    cached_file = ASC_CACHE_DIR / f'{key}.wasm'
+    if cached_file.exists():
+        return cached_file.read_bytes()
+
+    # asc reports warnings on stderr as well, so only the missing binary tells us that compilation failed.
+    out_bytes, err = get_asc_worker().compile(assemblyscript)
+    if not out_bytes:
+        raise ValueError(err)
+
+    store_in_cache(f'{key}.wasm', out_bytes)
+    return out_bytes
+
+
+def find_assemblyscript_sources(function) -> Iterable[str]:
+    """Yield every string literal passed to `from_code()` within the given test function.
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(function))
+    except (OSError, TypeError):
+        return
+
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'from_code' \
+                and node.args:
+            literal = get_string_literal(node.args[0])
+            if literal is not None:
+                yield literal
+
+
+def get_string_literal(node: ast.AST) -> Optional[str]:
+    # Before Python 3.8, string literals are parsed as ast.Str rather than ast.Constant.
+    if sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        return node.s
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Compile the AssemblyScript of all collected tests which is not yet cached, before any test runs.
+
+    This runs after -k and -m have deselected tests, so only the sources of tests which will run are compiled.
+    Whatever fails to compile here, including because the compiler cannot be run at all, is simply compiled
+    again by the test, which will then report the error.
+    """
+    try:
+        sources = {}
+        for item in items:
+            if 'from_code' in getattr(item, 'fixturenames', ()):
+                for assemblyscript in find_assemblyscript_sources(item.function):
+                    key = get_cache_key(assemblyscript)
+                    if not (ASC_CACHE_DIR / f'{key}.wasm').exists():
+                        sources[key] = assemblyscript
+
+        for key, assemblyscript in sources.items():
+            out_bytes, err = get_asc_worker().compile(assemblyscript)
+            if out_bytes:
+                store_in_cache(f'{key}.wasm', out_bytes)
+    except (OSError, RuntimeError):
+        reset_asc_worker()
+
+
+@pytest.fixture(scope='session')
+def asc():
+    """The AssemblyScript compiler, as a function from source code to wasm bytes, shared by the whole session.
+
+    TODO: It would be super cool if we could run the AssemblyScript compiler through WASM. There is no
+    standalone wasm build of asc though (it needs a JavaScript host), so for now this goes through node.
+    """
+    return compile_assemblyscript
+
+
+def load_wasm_module(wasm_bytes: bytes, *, key: str) -> wasmer.Module:
+    """Compile `wasm_bytes` with wasmer.
+
+    If the installed wasmer version supports it, the compiled module is serialized to the cache, so that
+    later test runs do not have to compile it again.
+    """
+    if not hasattr(wasmer.Module, 'serialize'):
+        return wasmer.Module(wasm_bytes)
+
+    serialized_file = ASC_CACHE_DIR / f'{key}.{WASMER_CACHE_TAG}.cwasm'
+    if serialized_file.exists() and is_trusted(serialized_file):
+        try:
+            return wasmer.Module.deserialize(serialized_file.read_bytes())
+        except Exception:
+            # Fall through and replace the broken artifact.
+            pass
+
+    module = wasmer.Module(wasm_bytes)
+    store_in_cache(serialized_file.name, module.serialize())
+    return module
+
+
+@pytest.fixture(scope='session')
+def wasm_modules():
+    """Compiled `wasmer.Module` objects for the whole test session, keyed by the sha256 of their wasm bytes.
+
+    Compiling a module is far more expensive than instantiating it, so tests only pay for the latter.
+
+    Instances themselves are deliberately not pooled: wasmer offers no way to reset an instance's memory and
+    globals, and tests rely on a fresh heap (e.g. to check refcounts or where allocations end up).
+    """
+    return {}
+
 
 @pytest.fixture
-def from_code(tmpdir):
+def from_code(asc, wasm_modules):
     def from_code(assemblyscript: str) -> Module:
         """
         Run "asc", the AssemblyScript compiler, load the wasm module, wrap it in a Module to test.
-
-        TODO: It would be super cool if we could run the AssemblyScript compiler through WASM.
         """
-        scriptfile = tmpdir.join('code.ts')
-        scriptfile.write_text(assemblyscript, encoding='utf-8')
-
-        process = subprocess.Popen(
-            ['npx', '-q', 'assemblyscript', str(scriptfile), '-b', '--use', 'abort='],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out_bytes, err = process.communicate()
-        if err:
-            raise ValueError(err)
-        module = wasmer.Module(out_bytes)
+        out_bytes = asc(assemblyscript)
+
+        key = hashlib.sha256(out_bytes).hexdigest()
+        module = wasm_modules.get(key)
+        if module is None:
+            module = wasm_modules[key] = load_wasm_module(out_bytes, key=key)
 
         instance = module.instantiate()
         return Module(instance)
@@ -2,7 +2,7 @@ from typing import List
 
 import pytest
 
-from wasmbind.module import AssemblyScriptArray, OpaqueValue
+from wasmbind.module import AssemblyScriptArray, MAX_CACHED_STRING_LENGTH, OpaqueValue
 
 
 def test_strings(from_code):
@@ -24,12 +24,64 @@ def test_empty_string(from_code):
     assert module.helloworld("", as_=str) == ''
 
 
+def test_repeated_string_is_allocated_once(from_code):
+    module = from_code("""
+    export function identity(s: string): string {
+        return s
+    }
+    """)
+
+    assert module.identity("foo") == module.identity("foo")
+    assert module.identity("foo") != module.identity("bar")
+
+
+def test_string_cache_releases_oldest(from_code, monkeypatch):
+    module = from_code("""
+    export function identity(s: string): string {
+        return s
+    }
+    """)
+
+    monkeypatch.setattr('wasmbind.module.MAX_CACHED_STRINGS', 2)
+    released = []
+    release = module._release
+    monkeypatch.setattr(module, '_release', lambda pointer: released.append(pointer) or release(pointer))
+
+    foo = module.get_string_pointer("foo")
+    bar = module.get_string_pointer("bar")
+    assert module.get_string_pointer("foo") == foo
+    module.get_string_pointer("baz")
+    assert released == [bar]
+
+    module.collect()
+    assert not module._string_cache
+    assert foo in released
+
+
+def test_long_string_is_not_cached(from_code, monkeypatch):
+    module = from_code("""
+    export function identity(s: string): string {
+        return s
+    }
+    """)
+
+    retained = []
+    retain = module._retain
+    monkeypatch.setattr(module, '_retain', lambda pointer: retained.append(pointer) or retain(pointer))
+
+    value = "x" * (MAX_CACHED_STRING_LENGTH + 1)
+    assert module.identity(value) == value
+    assert not retained
+    assert value not in module._string_cache
+
+
 def test_root_function(from_code):
     module = from_code("""
     export function sum(a: i32, b: i32): i32 {
         return a + b;
     }
     """)
+    assert 'sum' in dir(module)
     assert module.sum(1, 2) == 3
 
 
@@ -71,6 +123,12 @@ class TestResolve:
         """)
         assert module.resolve(module.getS()) == "foo";
 
+    def test_resolve_null(self, from_code):
+        module = from_code("""
+        export function getS(): string | null { return null; }
+        """)
+        assert module.getS(as_=str) is None
+
     def test_resolve_integer_list(self, from_code):
         module = from_code("""            
         export function getList(): u8[] {
@@ -155,6 +213,7 @@ class TestArrays:
         # Index access
         assert array[0] == 1
         assert array[1:3] == [2, 3]
+        assert array.tolist() == [1, 2, 3]
 
         # Can pass array to WASM
         assert module.sum(array) == 6
@@ -163,6 +222,50 @@ class TestArrays:
         array[1:3] = [8, 5]
         assert module.sum(array) == 14
 
+    def test_alloc_array_from_bytes(self, from_code):
+        module = from_code("""
+        export const Uint16ArrayId = idof<Array<u16>>();
+        export const Uint32ArrayId = idof<Array<u32>>();
+        """)
+
+        # The bytes are the elements, not the raw data of the array.
+        assert list(module.alloc_array(module.Uint16ArrayId, b'\x01\x02\x03\x04')) == [1, 2, 3, 4]
+        assert list(module.alloc_array(module.Uint32ArrayId, bytearray([1, 2]))) == [1, 2]
+
+    def test_alloc_array_value_out_of_range(self, from_code):
+        module = from_code("""
+        export const Uint8ArrayId = idof<Array<u8>>();
+        """)
+
+        with pytest.raises(OverflowError):
+            module.alloc_array(module.Uint8ArrayId, [1, 256])
+        with pytest.raises(OverflowError):
+            module.alloc_array(module.Uint8ArrayId, [-1])
+
+    def test_as_numpy(self, from_code):
+        numpy = pytest.importorskip('numpy')
+        module = from_code("""
+        export const Int32ArrayId = idof<Array<i32>>();
+        export function sum(arg: i32[]): i32 {
+            return arg.reduce((a, b) => a + b, 0);
+        };
+        """)
+
+        array = module.alloc_array(module.Int32ArrayId, [1, -2, 3])
+        view = array.as_numpy()
+        assert view.dtype == numpy.int32
+        assert view.tolist() == [1, -2, 3]
+
+        # The numpy array shares memory with the WASM array
+        view[1] = 5
+        assert array[1] == 5
+        assert module.sum(array) == 9
+
+        # Converting with numpy.array() copies, rather than handing out another view.
+        copied = numpy.array(array)
+        copied[0] = 7
+        assert array[0] == 1
+
     def test_access_wasm_created_array(self, from_code):
         module = from_code("""        
         export function getFoo(): i32[] {
@@ -208,6 +311,23 @@ class TestGarbageCollect:
         module.release(foo_pointer)
         assert module.get_refcount_of(foo_pointer) == 1
 
+    def test_resolve_again_after_del(self, from_code):
+        module = from_code("""
+        export class Foo { constructor(public x: i32) {} }
+        export function getFoos(): Foo[] { return [new Foo(1)]; }
+        """)
+
+        array = module.resolve(module.getFoos(), List[module.Foo])
+        foo = array[0]
+        refcount = module.get_refcount_of(foo)
+        del foo
+
+        # The release queued for the first wrapper is done before the second one retains the pointer.
+        foo = array[0]
+        assert not module._pending_releases
+        assert module.get_refcount_of(foo) == refcount
+        assert foo.x == 1
+
     def test_release_on_del(self, from_code):
         module = from_code("""
         export class Foo { constructor(public x: i32) {} }        
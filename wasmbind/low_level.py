@@ -3,12 +3,23 @@
 
 # Before a data type, the memory stores the type and the size
 # https://github.com/AssemblyScript/assemblyscript/blob/e79155b86b1ea29798a1d7d38dbe4a443c91310b/lib/loader/index.js#L3
+import array
+import os
+import struct
+import sys
+from typing import Optional, Tuple, Sequence
+
 import wasmer
 
 ID_OFFSET = -8
 SIZE_OFFSET = -4
 REFCOUNT_OFFSET = -12
 
+# The same offsets, in u32 words, for indexing into a uint32_view: u32[(pointer >> 2) + ID_WORD_OFFSET]
+ID_WORD_OFFSET = ID_OFFSET >> 2
+SIZE_WORD_OFFSET = SIZE_OFFSET >> 2
+REFCOUNT_WORD_OFFSET = REFCOUNT_OFFSET >> 2
+
 
 # https://github.com/AssemblyScript/assemblyscript/blob/e79155b86b1ea29798a1d7d38dbe4a443c91310b/lib/loader/index.js#L8
 STRING_ID = 1
@@ -51,7 +62,22 @@ ARRAY_LENGTH_OFFSET = 12
 ARRAY_SIZE = 16
 
 
+# The type id and size fields are adjacent, so both can be read in one go, starting at ID_OFFSET.
+HEADER = struct.Struct('<II')
+U32 = struct.Struct('<I')
+
+
+# Loading a string or ArrayBuffer normally skips checking the type of the object if the caller already knows it.
+# Set WASMBIND_CHECK_TYPES=1 to always check.
+CHECK_TYPES = os.environ.get('WASMBIND_CHECK_TYPES', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 def get_instance_memory (instance: wasmer.Instance):
+    """Return the memory export of `instance`.
+
+    This goes through all exports, so callers which need the memory over and over should hold on to it, and
+    pass it to the functions here which accept a `memory` argument.
+    """
     for export_kv in instance.exports:
         (name, exported) = export_kv
         if isinstance(exported, wasmer.Memory):
@@ -59,70 +85,189 @@ def get_instance_memory (instance: wasmer.Instance):
 
     return
 
-def load_string(pointer: int, *, instance: wasmer.Instance):
+def get_memory_buffer(memory: wasmer.Memory) -> Optional[memoryview]:
+    """Return a memoryview over the complete linear memory, if the installed wasmer version exposes one.
+
+    Growing the memory invalidates the view, so do not hold on to it across calls into WASM.
+    """
+    buffer = getattr(memory, 'buffer', None)
+    if buffer is None:
+        return None
+    try:
+        return memoryview(buffer)
+    except TypeError:
+        return None
+
+def read_header(pointer: int, *, instance: wasmer.Instance, memory: wasmer.Memory = None) -> Tuple[int, int]:
+    """Return the (type id, size) header in front of the object at `pointer`.
+    """
+    address = pointer + ID_OFFSET
+    if address < 0:
+        # unpack_from() would count a negative offset from the end of the memory.
+        raise ValueError(f"Invalid pointer: {pointer}")
+
+    if memory is None:
+        memory = get_instance_memory(instance)
+    buffer = get_memory_buffer(memory)
+    if buffer is not None:
+        return HEADER.unpack_from(buffer, address)
+
+    u32 = memory.uint32_view(0)
+    word = pointer >> 2
+    return u32[word + ID_WORD_OFFSET], u32[word + SIZE_WORD_OFFSET]
+
+def read_u32(address: int, *, instance: wasmer.Instance, memory: wasmer.Memory = None) -> int:
+    if address < 0:
+        raise ValueError(f"Invalid address: {address}")
+
+    if memory is None:
+        memory = get_instance_memory(instance)
+    buffer = get_memory_buffer(memory)
+    if buffer is not None:
+        return U32.unpack_from(buffer, address)[0]
+    return memory.uint32_view(0)[address >> 2]
+
+def read_size(pointer: int, *, instance: wasmer.Instance, memory: wasmer.Memory = None) -> int:
+    """Return the size of the object at `pointer`, in bytes.
+    """
+    return read_u32(pointer + SIZE_OFFSET, instance=instance, memory=memory)
+
+def load_string(pointer: int, *, instance: wasmer.Instance, check_type: bool = True, memory: wasmer.Memory = None):
     # Strings seems to be encoded as a utf-16 string, prefixed with a u32 giving the length.
     # https://github.com/AssemblyScript/docs/blob/master/standard-library/string.md
     # https://github.com/onsails/wasmer-as/blob/fe096b492d3c7a5f49214b76a7aff75fe6343c5f/src/lib.rs#L23
     # https://github.com/AssemblyScript/assemblyscript/blob/e79155b86b1ea29798a1d7d38dbe4a443c91310b/lib/loader/index.js#L43
 
-    mybytes = _load_type_bytes(pointer, STRING_ID, instance=instance)
-    return mybytes.decode('utf-16')
+    # Decode straight from WASM memory where possible. Be explicit about the byte order, so there is no BOM sniffing.
+    data = _load_type_data(pointer, STRING_ID, instance=instance, check_type=check_type, memory=memory)
+    return str(data, 'utf-16-le')
 
-def load_bytes(pointer: int, *, instance: wasmer.Instance):
-    return _load_type_bytes(pointer, ARRAYBUFFER_ID, instance=instance)
+def load_bytes(pointer: int, *, instance: wasmer.Instance, check_type: bool = True, memory: wasmer.Memory = None):
+    return bytes(_load_type_data(pointer, ARRAYBUFFER_ID, instance=instance, check_type=check_type, memory=memory))
 
-def _load_type_bytes(pointer: int, need_type: int, *, instance: wasmer.Instance):
-    u32 = get_instance_memory(instance).uint32_view(0)
+def _load_type_data(pointer: int, need_type: int, *, instance: wasmer.Instance, check_type: bool = True,
+                    memory: wasmer.Memory = None):
+    """Return the data of the object at `pointer` as a bytes-like object.
 
-    datatype = u32[int((pointer + ID_OFFSET) / 4)]
-    assert datatype == need_type
+    This is a memoryview into WASM memory if wasmer exposes the memory buffer, so it must not outlive the call.
 
-    bytes_length = u32[int((pointer + SIZE_OFFSET) / 4)]
+    With `check_type=False`, the caller vouches for the object being of type `need_type`, and we only read its size.
 
-    u8 = get_instance_memory(instance).uint8_view(pointer)
-    if bytes_length:
-        string_bytes = u8[:bytes_length]
-        return bytes(string_bytes)
+    Pass the instance's `memory` if you have it at hand, to save looking it up; the same goes for the other
+    functions here which accept it.
+    """
+    if memory is None:
+        memory = get_instance_memory(instance)
+
+    if check_type or CHECK_TYPES:
+        datatype, bytes_length = read_header(pointer, instance=instance, memory=memory)
+        assert datatype == need_type
     else:
+        bytes_length = read_size(pointer, instance=instance, memory=memory)
+
+    if not bytes_length:
         return b""
+    buffer = get_memory_buffer(memory)
+    if buffer is not None:
+        return buffer[pointer:pointer + bytes_length]
 
-def allocate_string(v: str, *, instance: wasmer.Instance):
+    return bytes(memory.uint8_view(pointer)[:bytes_length])
+
+def allocate_string(v: str, *, instance: wasmer.Instance, alloc=None, memory: wasmer.Memory = None):
     # https://github.com/AssemblyScript/assemblyscript/blob/e79155b86b1ea29798a1d7d38dbe4a443c91310b/lib/loader/index.js#L120
     bytes = v.encode('utf-16le')  # Without BOM
-    return _allocate_bytes(bytes, STRING_ID, instance);
+    return _allocate_bytes(bytes, STRING_ID, instance, alloc, memory);
+
+def allocate_arraybuffer(v: bytes, *, instance: wasmer.Instance, alloc=None, memory: wasmer.Memory = None):
+    return _allocate_bytes(v, ARRAYBUFFER_ID, instance, alloc, memory);
 
-def allocate_arraybuffer(v: bytes, *, instance: wasmer.Instance):
-    return _allocate_bytes(v, ARRAYBUFFER_ID, instance);
+def _allocate_bytes(vbytes: bytes, type_id: int, instance: wasmer.Instance, alloc=None,
+                    memory: wasmer.Memory = None):
+    """Allocate an object of type `type_id` holding `vbytes`.
 
-def _allocate_bytes(vbytes: bytes, type_id: int, instance: wasmer.Instance):
-    pointer = instance.exports.__new(len(vbytes), type_id)
+    `alloc` is the instance's `__new` export; pass it if you have it at hand, to save looking it up.
+    """
+    if alloc is None:
+        alloc = instance.exports.__new
+    pointer = alloc(len(vbytes), type_id)
 
-    buffer = get_instance_memory(instance).uint8_view(pointer)
-    buffer[:len(vbytes)] = vbytes
+    # Only look at the memory buffer after allocating, which may have grown it.
+    if memory is None:
+        memory = get_instance_memory(instance)
+    buffer = get_memory_buffer(memory)
+    if buffer is not None:
+        buffer[pointer:pointer + len(vbytes)] = vbytes
+        U32.pack_into(buffer, pointer + SIZE_OFFSET, len(vbytes))
+        return pointer
 
-    lengthview = get_instance_memory(instance).uint32_view(0)
-    lengthview[int(pointer / 4) - 1] = len(vbytes)
+    memory.uint8_view(pointer)[:len(vbytes)] = bytes(vbytes)
+    lengthview = memory.uint32_view(0)
+    lengthview[(pointer >> 2) + SIZE_WORD_OFFSET] = len(vbytes)
     return pointer
 
-def get_array_view_class(instance: wasmer.Instance, *, is_float: bool, alignment: int, is_signed: bool):
+# The wasmer memory view for every (is_float, alignment, is_signed) combination it offers one for.
+ARRAY_VIEWS = {
+    (False, 0, False): 'uint8_view',
+    (False, 0, True): 'int8_view',
+    (False, 1, False): 'uint16_view',
+    (False, 1, True): 'int16_view',
+    (False, 2, False): 'uint32_view',
+    (False, 2, True): 'int32_view',
+}
+
+def get_array_view_class(instance: wasmer.Instance, *, is_float: bool, alignment: int, is_signed: bool,
+                         memory: wasmer.Memory = None):
     """Given the requested array configuration, return a view class that can be used over the memory segment
     of that array, to access and write to the elements of that WASM array in Python.
     """
-    m = get_instance_memory(instance)
-    if is_float:
-        # For now, wasmer does not offer view classes for this; either wait for them to add them,
-        # or implement one ourselves.
-        raise ValueError("float arrays are not yet supported.")
-    else:
-        if alignment == 0:
-            return m.int8_view if is_signed else m.uint8_view
-        if alignment == 1:
-            return m.int16_view if is_signed else m.uint16_view
-        if alignment == 2:
-            return m.int32_view if is_signed else m.uint32_view
+    view_name = ARRAY_VIEWS.get((is_float, alignment, is_signed))
+    if view_name is None:
+        # For now, wasmer does not offer view classes for floats or 64bit integers; either wait for them to
+        # add them, or implement one ourselves.
+        if is_float:
+            raise ValueError("float arrays are not yet supported.")
         if alignment == 3:
-            # For now, wasmer does not offer a view class for this; either wait for them to add one, or
-            # implement one ourselves.
             raise ValueError("64bit arrays are not yet supported.")
+        raise ValueError("Invalid align value.")
+
+    if memory is None:
+        memory = get_instance_memory(instance)
+    return getattr(memory, view_name)
+
+# The `array` module type codes for (alignment, is_signed). "i" is four bytes wide on every platform we care for.
+ARRAY_TYPECODES = {
+    (0, False): 'B',
+    (0, True): 'b',
+    (1, False): 'H',
+    (1, True): 'h',
+    (2, False): 'I',
+    (2, True): 'i',
+}
+
+def pack_array(values: Sequence[int], *, alignment: int, is_signed: bool):
+    """Return the integer `values` as the raw bytes of a WASM array with the given element configuration.
+
+    If `values` already is a buffer with that layout (say bytes, an `array.array` or a numpy array), it is used
+    as-is rather than being converted. Raises `OverflowError` if a value does not fit into an element.
+    """
+    typecode = ARRAY_TYPECODES.get((alignment, is_signed))
+    if typecode is None:
+        raise ValueError("Invalid align value.")
+
+    try:
+        view = memoryview(values)
+    except TypeError:
+        pass
+    else:
+        # WASM memory is always little endian, so native formats only qualify on little endian hosts.
+        native = sys.byteorder == 'little' and view.format.lstrip('@=') == typecode
+        if (native or view.format == '<' + typecode) and view.ndim == 1 and view.c_contiguous:
+            return view.cast('B')
+        # Given a buffer, array.array() would take its raw bytes rather than its elements.
+        values = list(values)
 
-    raise ValueError("Invalid align value.")
+    packed = array.array(typecode, values)
+    # WASM memory is always little endian.
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
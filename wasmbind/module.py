@@ -1,41 +1,60 @@
 import dataclasses
 import functools
-from collections import Sequence
+import weakref
+from collections import OrderedDict
+from collections.abc import Sequence
 from inspect import isclass
-from typing import Dict, Any, Iterable, Union, Optional, List, TypeVar
-from weakref import WeakValueDictionary
+from typing import Dict, Any, Union, Optional, List, TypeVar, Tuple
 
 import wasmer
 
-from wasmbind.low_level import ID_OFFSET, SIZE_OFFSET, REFCOUNT_OFFSET, STRING_ID, ARRAYBUFFER_ID, ARRAYBUFFERVIEW, \
-    ARRAY, VAL_ALIGN_OFFSET, VAL_SIGNED, VAL_FLOAT, VAL_MANAGED, ARRAYBUFFERVIEW_BUFFER_OFFSET, \
+from wasmbind.low_level import ID_WORD_OFFSET, REFCOUNT_WORD_OFFSET, SIZE_OFFSET, STRING_ID, ARRAYBUFFER_ID, \
+    ARRAYBUFFERVIEW, ARRAY, VAL_ALIGN_OFFSET, VAL_SIGNED, VAL_FLOAT, VAL_MANAGED, ARRAYBUFFERVIEW_BUFFER_OFFSET, \
     ARRAYBUFFERVIEW_DATASTART_OFFSET, ARRAYBUFFERVIEW_DATALENGTH_OFFSET, ARRAYBUFFERVIEW_SIZE, ARRAY_LENGTH_OFFSET, \
     ARRAY_SIZE, load_string, get_array_view_class, allocate_string, \
-    get_instance_memory, load_bytes, allocate_arraybuffer
+    get_instance_memory, load_bytes, allocate_arraybuffer, pack_array, get_memory_buffer
 
 WasmMemPointer = int
 
+# Releases of AssemblyScript objects GCed in Python are queued, and done in batches of at most this size.
+MAX_PENDING_RELEASES = 256
+
+# Marks a missing entry in the opaque value registry.
+_MISSING = object()
+
+# Strings passed as arguments are kept allocated for reuse, up to this many, and if not longer than this.
+MAX_CACHED_STRINGS = 256
+MAX_CACHED_STRING_LENGTH = 64
+
 
 class OpaqueValue:
     """Represents a value registered in the modules opaque value registry.
     """
 
+    __slots__ = ('_id',)
+
     def __init__(self, id):
-        self.id = id
+        self._id = id
 
 
 class AssemblyScriptObject:
     """An opaque Python object wrapping a AssemblyScript object.
 
     This Python object keeps a reference to the AS object in WASM memory, and once the object
-    has been GCed in Python, it will decrease the AS reference count.
+    has been GCed in Python, it will decrease the AS reference count. That happens with a delay, see
+    `AssemblyScriptModule.flush_releases()`.
     """
 
-    _id: str
-    _module = None
+    # There can be lots of these; do without a __dict__.
+    __slots__ = ('_id', '_module', '__weakref__')
+
+    _id: WasmMemPointer
 
     def __del__(self):
-        self._module.release(self._id)
+        pending = self._module._pending_releases
+        pending.append(self._id)
+        if len(pending) >= MAX_PENDING_RELEASES:
+            self._module.flush_releases()
 
     def __repr__(self):
         return f'<{type(self).__name__}@{self._id}>'
@@ -45,12 +64,18 @@ class AssemblyScriptObject:
             return self._id == other._id
         return False
 
+    def __hash__(self):
+        return hash(self._id)
+
     @classmethod
     def create(cls, pointer: WasmMemPointer, *, module):
         obj = object.__new__(cls)
         obj._id = pointer
         obj._module = module
-        module.retain(pointer)
+        # The pointer could be waiting to be released by a previous wrapper, which has to happen first.
+        if module._pending_releases:
+            module.flush_releases()
+        module._retain(pointer)
         return obj
 
     def as_(self, type):
@@ -61,31 +86,88 @@ class AssemblyScriptObject:
 
 
 class AssemblyScriptClass(AssemblyScriptObject):
-    pass
+    __slots__ = ()
 
 
 class AssemblyScriptArray(AssemblyScriptObject, Sequence):
 
-    _length = None
-    _buffer_view = None
-    _managed_class = None
+    __slots__ = ('_length', '_buffer_view', '_managed_class', '_data_pointer', '_type')
 
     # noinspection PyMethodOverriding
     @classmethod
-    def create(cls, pointer: WasmMemPointer, *, length: int, buffer_view, managed_class=None, module):
-        array = super().create(pointer, module=module)
+    def create(cls, pointer: WasmMemPointer, *, length: int, buffer_view, managed_class=None, module,
+               data_pointer: WasmMemPointer = None, rtti_type: 'RTTIType' = None):
+        array = object.__new__(cls)
+        array._id = pointer
+        array._module = module
         array._length = length
         array._buffer_view = buffer_view
-        array._id = pointer
         array._managed_class = managed_class
-        array._module = module
+        array._data_pointer = data_pointer
+        array._type = rtti_type
+        if module._pending_releases:
+            module.flush_releases()
+        module._retain(pointer)
         return array
 
+    def as_numpy(self):
+        """Return a numpy array over the elements of this array, without copying them.
+
+        Like the array itself, this is a live view on the module's memory. It becomes invalid if the memory
+        grows, so do not hold on to it across calls into WASM. Requires numpy to be installed.
+        """
+        import numpy
+
+        if self._managed_class or self._data_pointer is None:
+            raise TypeError("Only arrays of numbers can be viewed as numpy arrays.")
+
+        buffer = get_memory_buffer(self._module._memory)
+        if buffer is None:
+            raise ValueError("The installed wasmer version does not expose the memory buffer.")
+
+        kind = 'f' if self._type.is_float else 'i' if self._type.is_signed else 'u'
+        dtype = numpy.dtype(f'<{kind}{1 << self._type.value_align}')
+        return numpy.frombuffer(buffer, dtype=dtype, count=self._length, offset=self._data_pointer)
+
     def __len__(self):
         return self._length
 
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        # numpy.array() and friends get a copy unless they insist on none; a view would dangle once the memory
+        # grows. Use as_numpy() to ask for one explicitly.
+        import numpy
+
+        if self._managed_class or self._data_pointer is None:
+            if copy is False:
+                raise ValueError("Arrays of references cannot be converted without copying.")
+            return numpy.array(self.tolist(), dtype=object if dtype is None else dtype)
+
+        array = self.as_numpy()
+        if dtype is not None and numpy.dtype(dtype) != array.dtype:
+            if copy is False:
+                raise ValueError(f"Cannot convert to {dtype} without copying.")
+            return array.astype(dtype)
+        return array if copy is False else array.copy()
+
+    def tolist(self) -> list:
+        """Return the elements of this array as a Python list.
+
+        This reads the whole array from memory at once, rather than element by element.
+        """
+        values = self._buffer_view[:self._length] if self._length else []
+
+        if self._managed_class:
+            return [self._module.resolve(value, self._managed_class) for value in values]
+
+        return list(values)
+
     def __getitem__(self, idx: int):
-        idx = validate_index(idx, self._length)
+        # Plain in-range indices are by far the most common case, and do not need validate_index().
+        if type(idx) is not int or not 0 <= idx < self._length:
+            idx = validate_index(idx, self._length)
         value = self._buffer_view[idx]
 
         if self._managed_class:
@@ -94,10 +176,11 @@ class AssemblyScriptArray(AssemblyScriptObject, Sequence):
         return value
 
     def __setitem__(self, idx: int, value):
-        idx = validate_index(idx, self._length)
+        if type(idx) is not int or not 0 <= idx < self._length:
+            idx = validate_index(idx, self._length)
 
         if self._managed_class:
-            value = self._module.resolve_pointer(value)
+            value = self._module.get_pointer(value)
 
         self._buffer_view[idx] = value
 
@@ -105,7 +188,7 @@ class AssemblyScriptArray(AssemblyScriptObject, Sequence):
         if super().__eq__(other):
             return True
         if isinstance(other, Sequence):
-            return list(self) == other
+            return self.tolist() == other
         return False
 
 
@@ -119,23 +202,31 @@ def validate_index(idx: Union[int, slice], length: int) -> Union[int, slice]:
     return idx
 
 
-# https://codegolf.stackexchange.com/a/177280
-clz32 = lambda n:35-len(bin(-n))&~n>>32
-
-
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class RTTIType:
+    # Besides the fields, the flags we check over and over are decoded once, in __post_init__().
+    __slots__ = ('id', 'base_id', 'flags', 'value_align', 'is_arraybufferview', 'is_array', 'is_float',
+                 'is_signed', 'is_managed')
+
     id: int
     base_id: int
     flags: int
 
-    def has(self, flag: int) -> bool:
-        return bool(self.flags & flag)
+    def __post_init__(self):
+        flags = self.flags
+        set_attr = functools.partial(object.__setattr__, self)
 
-    @property
-    def value_align(self):
         # https://github.com/AssemblyScript/assemblyscript/blob/e79155b86b1ea29798a1d7d38dbe4a443c91310b/lib/loader/index.js#L110
-        return 31 - clz32((self.flags >> VAL_ALIGN_OFFSET) & 31)   # -1 if none
+        # 31 - clz32(x) is the index of the highest set bit, which is what int.bit_length() gives us directly.
+        set_attr('value_align', ((flags >> VAL_ALIGN_OFFSET) & 31).bit_length() - 1)   # -1 if none
+        set_attr('is_arraybufferview', bool(flags & ARRAYBUFFERVIEW))
+        set_attr('is_array', bool(flags & ARRAY))
+        set_attr('is_float', bool(flags & VAL_FLOAT))
+        set_attr('is_signed', bool(flags & VAL_SIGNED))
+        set_attr('is_managed', bool(flags & VAL_MANAGED))
+
+    def has(self, flag: int) -> bool:
+        return bool(self.flags & flag)
 
 
 class AssemblyScriptModule:
@@ -143,21 +234,107 @@ class AssemblyScriptModule:
     def __init__(self, instance: wasmer.Instance):
         self.instance = instance
 
+        # The memory is passed to all low_level functions, which would otherwise have to look for it among the
+        # exports every time. wasmer views look up the memory on every access, so they remain valid even if it
+        # grows, and we can hold on to one for all pointer lookups.
+        memory = self._memory = get_instance_memory(instance)
+        self._u32 = memory.uint32_view() if memory is not None else None
+
+        # The RTTI table is static data, so it can be read in once; see load_type().
+        self._rtti_types: Dict[int, RTTIType] = {}
+
+        # View classes over this instance's memory, by (is_float, alignment, is_signed).
+        self._array_view_classes = {}
+
+        # All exports by name. Enumerating them goes through wasmer every time, so do it only once.
+        self._exports: Dict[str, Any] = dict(instance.exports)
+
+        # The runtime interface, resolved once since we call it all the time; releasing happens on every __del__.
+        # The public names are read-only properties, so that exports of the same name cannot replace them.
+        exports = self._exports
+        self._alloc = exports.get('__new')
+        self._retain = exports.get('__pin')
+        self._release = exports.get('__unpin')
+        self._collect = exports.get('__collect')
+        self._rtti_base = exports.get('__rtti_base')
+
+        # Pointers of objects GCed in Python which we have yet to release, see flush_releases().
+        self._pending_releases: List[WasmMemPointer] = []
+
+        # Retained pointers of recently passed strings, least recently used first, see get_string_pointer().
+        self._string_cache: 'OrderedDict[str, WasmMemPointer]' = OrderedDict()
+
+        # Values passed through register_opaque_value(), by id. Each entry is (is_weak, value), where value is
+        # a weakref if is_weak is set; this way, resolving one takes a single lookup.
+        self._opaque_values: Dict[int, Tuple[bool, Any]] = {}
+        self._last_opaque_id = 0
+
+    def flush_releases(self):
+        """Release all AssemblyScript objects whose Python wrappers have been GCed.
+
+        Rather than calling into WASM for every single wrapper that is GCed, we queue the releases, and do
+        them before anything which could observe them: calling into the module, allocating, collecting, or
+        looking at refcounts.
+        """
+        pending = self._pending_releases
+        # A release can trigger more __del__ calls, which append to the list while we work through it.
+        while pending:
+            self._release(pending.pop())
+
     @property
     def alloc(self):
-        return getattr(self.instance.exports, '__new')
+        return self._alloc
 
     @property
     def retain(self):
-        return getattr(self.instance.exports, '__pin')
+        return self._retain
 
     @property
     def release(self):
-        return getattr(self.instance.exports, '__unpin')
+        return self._release
 
     @property
     def collect(self):
-        return getattr(self.instance.exports, '__collect')
+        return self._collect_garbage
+
+    def _collect_garbage(self):
+        if self._pending_releases:
+            self.flush_releases()
+        # Otherwise, the cached strings could never be collected.
+        self.clear_string_cache()
+        return self._collect()
+
+    def get_string_pointer(self, v: str) -> WasmMemPointer:
+        """Return a pointer to the string `v` in WASM memory.
+
+        The same strings tend to be passed again and again, so short ones are cached: the cache holds a reference
+        to each, and releases it once the string has not been used for a while, or on `collect()`. AssemblyScript
+        strings are immutable, so sharing them between calls is safe.
+
+        A cache hit does not retain the string again; the one reference held by the cache already keeps it alive
+        for as long as it is cached, and pinning an object twice aborts.
+        """
+        if len(v) > MAX_CACHED_STRING_LENGTH:
+            return allocate_string(v, instance=self.instance, alloc=self._alloc, memory=self._memory)
+
+        cache = self._string_cache
+        pointer = cache.get(v)
+        if pointer is not None:
+            cache.move_to_end(v)
+            return pointer
+
+        pointer = cache[v] = self._retain(
+            allocate_string(v, instance=self.instance, alloc=self._alloc, memory=self._memory))
+        if len(cache) > MAX_CACHED_STRINGS:
+            self._release(cache.popitem(last=False)[1])
+        return pointer
+
+    def clear_string_cache(self):
+        """Release all strings cached by `get_string_pointer()`.
+        """
+        cache = self._string_cache
+        while cache:
+            self._release(cache.popitem()[1])
 
     def get_pointer(self, instance: Union[WasmMemPointer, AssemblyScriptObject]) -> WasmMemPointer:
         """Resolve a Python wrapper class to the AssemblyScript pointer.
@@ -174,49 +351,55 @@ class AssemblyScriptModule:
             # You should use pointer.as_() instead.
             return pointer
 
-        # Opaque values are special, handle them first.
-        if isclass(as_) and issubclass(as_, OpaqueValue):
-            if pointer in self._opaque_values_weak:
-                return self._opaque_values_weak[pointer]
-            elif pointer in self._opaque_values:
-                return self._opaque_values[pointer]
+        # Nullable references; this must come before anything that skips checking the type.
+        if pointer == 0:
+            return None
+
+        # Without as_, look at what the type really is. If the caller told us, trust them, and do without
+        # reading the type from memory.
+        if not as_:
+            type = self.get_type_of(pointer)
+            if type.is_arraybufferview or type.is_array:
+                return self.resolve_array(pointer)
+            elif type.id == STRING_ID:
+                as_ = str
+            elif type.id == ARRAYBUFFER_ID:
+                as_ = bytes
             else:
-                raise ValueError("The opaque value registry only as weak references, and the value you registered no longer exists.")
+                raise ValueError(f"Cannot auto-detect the type of {pointer}, pass as_.")
 
-        # Since the use of as_ implies that this is an AssemlblyScript object, we can check what the type really
-        # is. This can serve for auto-detecting the type, or warning the user that the desired type is wrong.
-        type = self.get_type_of(pointer)
-        if type.has(ARRAYBUFFERVIEW):
-            auto_detected = List
-        elif type.has(ARRAY):
-            auto_detected = List
-        elif type.id == STRING_ID:
-            auto_detected = str
-        elif type.id == ARRAYBUFFER_ID:
-            auto_detected = bytes
-        else:
-            auto_detected = None
+        # Returning a string is the most common case, and is to be cheap.
+        if as_ is str:
+            return load_string(pointer, instance=self.instance, check_type=False, memory=self._memory)
 
-        if not as_:
-            as_ = auto_detected
+        if isclass(as_):
+            if issubclass(as_, AssemblyScriptObject):
+                return as_.create(pointer=pointer, module=self)
+
+            if issubclass(as_, OpaqueValue):
+                is_weak, value = self._opaque_values.get(pointer, (False, _MISSING))
+                if is_weak:
+                    value = value()
+                    if value is None:
+                        value = _MISSING
+                if value is _MISSING:
+                    raise ValueError("The opaque value registry only as weak references, and the value you registered no longer exists.")
+                return value
+
+            if issubclass(as_, str):
+                return load_string(pointer, instance=self.instance, check_type=False, memory=self._memory)
+
+            if issubclass(as_, bytes):
+                return load_bytes(pointer, instance=self.instance, check_type=False, memory=self._memory)
 
         # What is a good istypevar() check?
-        if hasattr(as_, '__args__') and as_._name == 'List':
-            arg = as_.__args__[0]
-            if not isinstance(arg, TypeVar):
+        elif getattr(as_, '_name', None) == 'List':
+            arg = getattr(as_, '__args__', (None,))[0]
+            if arg is not None and not isinstance(arg, TypeVar):
                 return self.resolve_array(pointer, managed_class=arg)
             else:
                 return self.resolve_array(pointer)
 
-        if isclass(as_) and issubclass(as_, AssemblyScriptObject):
-            return as_.create(pointer=pointer, module=self)
-
-        if isclass(as_) and issubclass(as_, str):
-            return load_string(pointer, instance=self.instance)
-
-        if isclass(as_) and issubclass(as_, bytes):
-            return load_bytes(pointer, instance=self.instance)
-
         raise ValueError("Unsupported _as: " + str(as_))
 
     def load_type(self, id: Union[int, RTTIType]) -> RTTIType:
@@ -239,34 +422,64 @@ class AssemblyScriptModule:
         if isinstance(id, RTTIType):
             return id
 
-        rtti_base = getattr(self.instance.exports, '__rtti_base')
+        rtti_type = self._rtti_types.get(id)
+        if rtti_type is None:
+            self._load_rtti_table()
+            rtti_type = self._rtti_types.get(id)
+            assert rtti_type is not None
+        return rtti_type
+
+    def _load_rtti_table(self):
+        """Read all types from the RTTI table at once, see `load_type()`.
+        """
+        rtti_base = self._rtti_base
         if not rtti_base:
             # AssemblyScript loader says "oop" in this case. I don't understand that or the code path.
             raise ValueError('RTTI table not found.')
 
         assert isinstance(rtti_base, wasmer.Global)
 
-        view = get_instance_memory(self.instance).uint32_view(rtti_base.value // 4)
-        count = view[0]
-        assert id < count
+        u32 = self._u32
+        base_index = rtti_base.value >> 2
+        count = u32[base_index]
+        table = u32[base_index + 1:base_index + 1 + count * 2]
 
-        mem_index = 1 + id * 2
-        return RTTIType(id=id, base_id=view[mem_index+1], flags=view[mem_index])
+        self._rtti_types = {
+            id: RTTIType(id=id, base_id=table[id * 2 + 1], flags=table[id * 2])
+            for id in range(count)
+        }
 
     def get_type_of(self, pointer: Union[WasmMemPointer, AssemblyScriptObject]) -> RTTIType:
         """Return the type of a pointer.
         """
-        pointer = self.get_pointer(pointer)
-        view = get_instance_memory(self.instance).uint32_view((pointer + ID_OFFSET) // 4)
-        type_id = view[0]
-        return self.load_type(type_id)
+        return self.load_type(self._u32[self._header_word(pointer, ID_WORD_OFFSET)])
 
     def get_refcount_of(self, pointer: Union[WasmMemPointer, AssemblyScriptObject]) -> RTTIType:
         """Return the refcount of a pointer.
         """
-        pointer = self.get_pointer(pointer)
-        view = get_instance_memory(self.instance).uint32_view((pointer + REFCOUNT_OFFSET) // 4)
-        return view[0]
+        if self._pending_releases:
+            self.flush_releases()
+        return self._u32[self._header_word(pointer, REFCOUNT_WORD_OFFSET)]
+
+    def _header_word(self, pointer: Union[WasmMemPointer, AssemblyScriptObject], word_offset: int) -> int:
+        """Return the index of a header field of `pointer` in `self._u32`.
+        """
+        word = (self.get_pointer(pointer) >> 2) + word_offset
+        if word < 0:
+            # Negative indices would count from the end of the memory.
+            raise ValueError(f"Invalid pointer: {pointer}")
+        return word
+
+    def get_array_view_class(self, *, is_float: bool, alignment: int, is_signed: bool):
+        """Like `low_level.get_array_view_class()`, but cached for this module.
+        """
+        key = (is_float, alignment, is_signed)
+        try:
+            return self._array_view_classes[key]
+        except KeyError:
+            klass = self._array_view_classes[key] = get_array_view_class(
+                self.instance, is_float=is_float, alignment=alignment, is_signed=is_signed, memory=self._memory)
+            return klass
 
     def resolve_array(self, pointer: WasmMemPointer, *, managed_class = None):
         """
@@ -275,25 +488,26 @@ class AssemblyScriptModule:
         Infers the array type from RTTI.
         """
         type = self.get_type_of(pointer)
-        if not (type.has(ARRAYBUFFERVIEW) or type.has(ARRAY)):
+        if not (type.is_arraybufferview or type.is_array):
             raise TypeError(f"The object at {pointer} is not an array.")
 
-        u32_view = get_instance_memory(self.instance).uint32_view()
+        u32_view = self._u32
 
-        buffer_pointer = u32_view[(pointer + ARRAYBUFFERVIEW_DATASTART_OFFSET) // 4]
-        length = u32_view[(pointer + ARRAY_LENGTH_OFFSET) // 4] \
-            if type.has(ARRAY) \
-            else u32_view[(buffer_pointer + SIZE_OFFSET) // 4]
+        buffer_pointer = u32_view[(pointer + ARRAYBUFFERVIEW_DATASTART_OFFSET) >> 2]
+        length = u32_view[(pointer + ARRAY_LENGTH_OFFSET) >> 2] \
+            if type.is_array \
+            else u32_view[(buffer_pointer + SIZE_OFFSET) >> 2]
 
-        klass = get_array_view_class(
-            self.instance, is_float=type.has(VAL_FLOAT), is_signed=type.has(VAL_SIGNED), alignment=type.value_align)
+        klass = self.get_array_view_class(
+            is_float=type.is_float, is_signed=type.is_signed, alignment=type.value_align)
         array_buffer_view = klass(buffer_pointer >> type.value_align)
 
-        is_managed = type.has(VAL_MANAGED)
+        is_managed = type.is_managed
         return AssemblyScriptArray.create(
             pointer,
             length=length, buffer_view=array_buffer_view, module=self,
-            managed_class=(managed_class or AssemblyScriptObject) if is_managed else None)
+            managed_class=(managed_class or AssemblyScriptObject) if is_managed else None,
+            data_pointer=buffer_pointer, rtti_type=type)
 
     def alloc_array(self, type_id: int, values):
         """
@@ -303,51 +517,57 @@ class AssemblyScriptModule:
         - https://docs.assemblyscript.org/details/memory#internals
         """
 
+        if self._pending_releases:
+            self.flush_releases()
+
         type = self.load_type(type_id)
-        if not type.has(ARRAYBUFFERVIEW | ARRAY):
+        if not (type.is_arraybufferview or type.is_array):
             raise TypeError(f"{type} is not an array type. If you want to use this type in an array, you need to"
                             f"create a concrete array type for it.")
 
         length = len(values)
         align = type.value_align
 
-        # Allocate an array buffer pointer to store the actual data, with the desired length
-        array_buffer_pointer = self.alloc(length << align, ARRAYBUFFER_ID)
+        # NB: >>> align will divide the 8bit pointers by the size of the array elements.
+        view_class = self.get_array_view_class(
+            is_float=type.is_float, alignment=align, is_signed=type.is_signed)
+
+        # Allocate an array buffer pointer to store the actual data, with the desired length. Plain numbers
+        # can be copied into it in one go.
+        if type.is_managed:
+            array_buffer_pointer = self._alloc(length << align, ARRAYBUFFER_ID)
+        else:
+            array_buffer_pointer = allocate_arraybuffer(
+                pack_array(values, alignment=align, is_signed=type.is_signed),
+                instance=self.instance, alloc=self._alloc, memory=self._memory)
 
         # Allocate an array
-        array_pointer = self.alloc(ARRAY_SIZE if type.has(ARRAY) else ARRAYBUFFERVIEW_SIZE, type_id)
-        array_view = get_instance_memory(self.instance).uint32_view(array_pointer // 4)
-        array_view[ARRAYBUFFERVIEW_BUFFER_OFFSET // 4] = self.retain(array_buffer_pointer)
-        array_view[ARRAYBUFFERVIEW_DATASTART_OFFSET // 4] = array_buffer_pointer
-        array_view[ARRAYBUFFERVIEW_DATALENGTH_OFFSET // 4] = length << align
-        if type.has(ARRAY):
-            array_view[ARRAY_LENGTH_OFFSET // 4] = length
+        array_pointer = self._alloc(ARRAY_SIZE if type.is_array else ARRAYBUFFERVIEW_SIZE, type_id)
+        u32 = self._u32
+        u32[(array_pointer + ARRAYBUFFERVIEW_BUFFER_OFFSET) >> 2] = self._retain(array_buffer_pointer)
+        u32[(array_pointer + ARRAYBUFFERVIEW_DATASTART_OFFSET) >> 2] = array_buffer_pointer
+        u32[(array_pointer + ARRAYBUFFERVIEW_DATALENGTH_OFFSET) >> 2] = length << align
+        if type.is_array:
+            u32[(array_pointer + ARRAY_LENGTH_OFFSET) >> 2] = length
 
-        # NB: >>> align will divide the 8bit pointers by the size of the array elements.
-        view_class = get_array_view_class(
-            self.instance,
-            is_float=type.has(VAL_FLOAT), alignment=align, is_signed=type.has(VAL_SIGNED))
         array_buffer_view = view_class(array_buffer_pointer >> align)
 
-        if type.has(VAL_MANAGED):
+        if type.is_managed:
             for idx, value in enumerate(values):
                 # For now, only allow classes to be added for consistency; we don't want to deal with ref counting
                 # pointer values.
                 if isinstance(value, str):
-                    array_buffer_view[idx] = self.retain(allocate_string(value, instance=self.instance))
+                    array_buffer_view[idx] = self._retain(
+                        allocate_string(value, instance=self.instance, alloc=self._alloc, memory=self._memory))
                 else:
                     assert isinstance(value, AssemblyScriptObject)
-                    array_buffer_view[idx] = self.retain(self.get_pointer(value))
-        else:
-            array_buffer_view[:length] = values
+                    array_buffer_view[idx] = self._retain(self.get_pointer(value))
 
         return AssemblyScriptArray.create(
             array_pointer, length=length, buffer_view=array_buffer_view, module=self,
-            managed_class=AssemblyScriptObject if type.has(VAL_MANAGED) else None)
+            managed_class=AssemblyScriptObject if type.is_managed else None,
+            data_pointer=array_buffer_pointer, rtti_type=type)
 
-    _opaque_values_weak = WeakValueDictionary()
-    _opaque_values = {}
-    _last_opaque_id = 0
     def register_opaque_value(self, value):
         """Register a value in a Python-side only registry. You will receive an integer you can pass to
         AssemblyScript, which can pass it back out, and it will resolve to the original value.
@@ -359,13 +579,33 @@ class AssemblyScriptModule:
         # Builtin types do not support weekrefs, but we do not want to hold on to references if we don't have to.
         # https://stackoverflow.com/a/52011601/15677
         if getattr(type(value), '__weakrefoffset__', 0) > 0:
-            self._opaque_values_weak[obj._id] = value
+            values = self._opaque_values
+            entry = (True, weakref.ref(value, lambda _, id=obj._id: values.pop(id, None)))
         else:
-            self._opaque_values[obj._id] = value
+            entry = (False, value)
+        self._opaque_values[obj._id] = entry
         return obj
 
 
-def convert(v, *, module: AssemblyScriptModule):
+def _convert_str(v: str, module: AssemblyScriptModule):
+    return module.get_string_pointer(v)
+
+
+def _convert_bytes(v: bytes, module: AssemblyScriptModule):
+    return allocate_arraybuffer(v, instance=module.instance, alloc=module._alloc, memory=module._memory)
+
+
+def _convert_opaque_value(v: OpaqueValue, module: AssemblyScriptModule):
+    return v._id
+
+
+def _convert_number(v, module: AssemblyScriptModule):
+    return v
+
+
+def _convert_other(v, module: AssemblyScriptModule):
+    # Wrapper classes are created per module, so they can't be in CONVERTERS; neither can subclasses of the
+    # types which are.
     if isinstance(v, AssemblyScriptObject):
         return module.get_pointer(v)
 
@@ -373,34 +613,79 @@ def convert(v, *, module: AssemblyScriptModule):
         return v._id
 
     elif isinstance(v, str):
-        return allocate_string(v, instance=module.instance)
+        return allocate_string(v, instance=module.instance, alloc=module._alloc, memory=module._memory)
 
     elif isinstance(v, bytes):
-        return allocate_arraybuffer(v, instance=module.instance)
+        return allocate_arraybuffer(v, instance=module.instance, alloc=module._alloc, memory=module._memory)
 
     else:
         return v
 
 
-def map_wasm_values(values: Iterable[Any], *, module: AssemblyScriptModule):
+# Values of these types are passed to WASM as they are.
+PLAIN_TYPES = frozenset({int, float, bool})
+
+
+# How to pass values of these exact types to WASM. Looking up type(v) here is faster than a chain of isinstance()
+# checks, and covers nearly all arguments.
+CONVERTERS = {
+    int: _convert_number,
+    float: _convert_number,
+    bool: _convert_number,
+    str: _convert_str,
+    bytes: _convert_bytes,
+    OpaqueValue: _convert_opaque_value,
+}
+
+
+def convert(v, *, module: AssemblyScriptModule):
+    return (CONVERTERS.get(type(v)) or _convert_other)(v, module)
+
+
+def map_wasm_values(values: Sequence, *, module: AssemblyScriptModule,
+                    _get_converter=CONVERTERS.get, _convert_other=_convert_other):
     """
     Replaces any `WasmRefValue` in `values` with the wasm id number.
+
+    Callers check for values which are all PLAIN_TYPES beforehand, and pass those on unchanged.
     """
-    return [convert(v, module=module) for v in values]
+    # A tuple, like the args we are usually given; f(*values) uses it as-is, where a list would be copied.
+    return tuple([(_get_converter(type(v)) or _convert_other)(v, module) for v in values])
 
 
 def make_function(f, *, module: AssemblyScriptModule):
+    # Everything wrapped() needs is bound as a default argument: those are plain locals, cheaper to read than
+    # closure cells or globals. They are not meant to be passed.
     @functools.wraps(f)
-    def wrapped(*args, as_=None):
-        value = f(*map_wasm_values(args, module=module))
+    def wrapped(*args, as_=None, _f=f, _module=module, _map=map_wasm_values, _plain=PLAIN_TYPES):
+        if _module._pending_releases:
+            _module.flush_releases()
+        # Most calls only pass numbers, which need no conversion at all.
+        if _plain.issuperset(map(type, args)):
+            value = _f(*args)
+        else:
+            value = _f(*_map(args, module=_module))
         if as_:
-            return module.resolve(value, as_=as_)
+            return _module.resolve(value, as_=as_)
         return value
     return wrapped
 
 
 def make_method(f, *, module):
-    return make_function(f, module=module)
+    """Like `make_function()`, but passes the pointer of `self` as the first argument.
+    """
+    @functools.wraps(f)
+    def method(self, *args, as_=None, _f=f, _module=module, _map=map_wasm_values, _plain=PLAIN_TYPES):
+        if _module._pending_releases:
+            _module.flush_releases()
+        if _plain.issuperset(map(type, args)):
+            value = _f(self._id, *args)
+        else:
+            value = _f(self._id, *_map(args, module=_module))
+        if as_:
+            return _module.resolve(value, as_=as_)
+        return value
+    return method
 
 
 def make_class(classname, class_exports: Dict, *, module: AssemblyScriptModule):
@@ -434,11 +719,17 @@ def make_class(classname, class_exports: Dict, *, module: AssemblyScriptModule):
             make_method(definition['set'], module=module) if 'set' in definition else None,
         )
 
-    def __new__(cls, *args):
+    def __new__(cls, *args, _ctor=ctor, _module=module, _map=map_wasm_values, _plain=PLAIN_TYPES):
+        if _module._pending_releases:
+            _module.flush_releases()
         # [REFCOUNTS] The object returned by a class constructor is auto-retained (refcount = 1)
-        _id = ctor(0, *map_wasm_values(args, module=module))
+        if _plain.issuperset(map(type, args)):
+            _id = _ctor(0, *args)
+        else:
+            _id = _ctor(0, *_map(args, module=_module))
         obj = object.__new__(cls)
         obj._id = _id
+        obj._module = _module
         return obj
 
     def __init__(self, *a, **kw):
@@ -448,7 +739,8 @@ def make_class(classname, class_exports: Dict, *, module: AssemblyScriptModule):
         return cls.create(pointer, module=module)
 
     attrs.update({
-        '_module': module,
+        # Like those of the base classes, instances only have the _id and _module slots.
+        '__slots__': (),
         '__new__': __new__,
         '__init__': __init__,
         'wrap': classmethod(wrap)
@@ -465,35 +757,62 @@ class Module(AssemblyScriptModule):
     def __init__(self, instance: wasmer.Instance):
         AssemblyScriptModule.__init__(self, instance)
 
-        classdict = {}
+        # Globals are read through __getattr__, since their value can change.
+        self._globals = {}
+
+        # Functions and classes are only wrapped once they are first accessed, in __getattr__; most code only
+        # uses a few of the exports of a module.
+        self._functions = {}
 
         # Split the exports into classes
-        exports_by_class = {}
+        self._classes = {}
 
-        for export_kv in instance.exports:
-            (name, func) = export_kv
+        for name, func in self._exports.items():
+            if isinstance(func, wasmer.Global):
+                self._globals[name] = func
+                continue
 
             if not isinstance(func, wasmer.Function):
-                pass
+                continue
 
-            if '#' in name:
-                classname, funcname = name.split('#', 1)
-                exports_by_class.setdefault(classname, {})
-                exports_by_class[classname][funcname] = func
+            classname, sep, funcname = name.partition('#')
+            if sep:
+                self._classes.setdefault(classname, {})[funcname] = func
 
-            elif name.startswith('__'):
+            elif name[:2] == '__':
+                # The runtime interface, see AssemblyScriptModule.
                 pass
 
             else:
-                classdict[name] = make_function(func, module=self)
+                self._functions[name] = func
 
-        # Create each class
-        for classname, attrs in exports_by_class.items():
-            classdict[classname] = make_class(classname, attrs, module=self)
+        # __getattr__ is never asked for names our own attributes already answer, so exports named like one of
+        # them are set up right away, as all exports used to be. They shadow our methods, but not the runtime
+        # hooks like retain or collect, which are properties.
+        for name in [name for name in (*self._functions, *self._classes)
+                     if name in self.__dict__ or hasattr(type(self), name)]:
+            self.__dict__[name] = self._materialize(name)
 
-        self.__dict__.update(classdict)
+    def _materialize(self, name: str):
+        """Wrap the function or class export `name`, which must not have been wrapped before.
+        """
+        if name in self._functions:
+            return make_function(self._functions.pop(name), module=self)
+        return make_class(name, self._classes.pop(name), module=self)
 
     def __getattr__(self, item):
-        export = getattr(self.instance.exports, item)
-        if isinstance(export, wasmer.Global):
+        # Only called for attributes not found otherwise, so once a function or class has been wrapped, it no
+        # longer goes through here.
+        d = self.__dict__
+        export = d.get('_globals', {}).get(item)
+        if export is not None:
             return export.value
+
+        if item in d.get('_functions', ()) or item in d.get('_classes', ()):
+            value = d[item] = self._materialize(item)
+            return value
+
+        raise AttributeError(item)
+
+    def __dir__(self):
+        return [*super().__dir__(), *self._globals, *self._functions, *self._classes]